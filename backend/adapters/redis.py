@@ -1,32 +1,107 @@
 from typing import List, Dict, Any, Optional
 import os
 import struct
+import numpy as np
 from fastapi import HTTPException
 import redis.asyncio as redis
+from redis.commands.search.field import VectorField, TagField, NumericField, TextField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from .base import VectorDatabase
+from .similarity_cache import SimilarityCache
+
+
+# HSET field names, encoded once; passed as flat args so redis-py skips
+# the per-row mapping-to-args conversion inside hset()
+_FIELDS = (b'vector', b'pdf_id', b'page_num', b'patch_index', b'title')
+
+
+# Process-wide connection pools keyed by server address. Endpoints call
+# connect()/disconnect() per request; sharing one pool keeps sockets
+# alive across requests and bounds file-descriptor usage for the process
+_POOLS: Dict[tuple, redis.ConnectionPool] = {}
+
+
+def _get_pool(host: str, port: int, decode_responses: bool = False) -> redis.ConnectionPool:
+    key = (host, port, decode_responses)
+    pool = _POOLS.get(key)
+    if pool is None:
+        pool = redis.ConnectionPool(
+            host=host,
+            port=port,
+            max_connections=int(os.getenv("REDIS_MAX_CONN", "64")),
+            # Binary protocol for vector blobs on the default pool; the
+            # decoding pool serves read paths whose replies are all text
+            decode_responses=decode_responses,
+            socket_timeout=5,
+            socket_connect_timeout=5
+        )
+        _POOLS[key] = pool
+    return pool
+
+
+# Verified client per server, shared across adapter instances. The
+# client is a thin pool wrapper and safe to share between request
+# handlers; caching it lets connect() skip the PING round trip after
+# the first successful handshake for that server
+_CLIENTS: Dict[tuple, redis.Redis] = {}
+
+
+async def _get_client(host: str, port: int, decode_responses: bool = False) -> redis.Redis:
+    key = (host, port, decode_responses)
+    client = _CLIENTS.get(key)
+    if client is None:
+        client = redis.Redis(connection_pool=_get_pool(host, port, decode_responses))
+        try:
+            # Verify once on first build; subsequent connect() calls trust
+            # the cached client and let per-command errors surface instead
+            await client.ping()
+        except Exception:
+            _POOLS.pop(key, None)
+            raise
+        _CLIENTS[key] = client
+    return client
 
 
 class RedisAdapter(VectorDatabase):
     def __init__(self):
         self.name = "Redis"
         self.client: Optional[redis.Redis] = None
+        self._text_client: Optional[redis.Redis] = None
         self.host = os.getenv("REDIS_HOST", "localhost")
         self.port = int(os.getenv("REDIS_PORT", "6379"))
+        # Pre-compiled pack formats keyed by dimension for the query path
+        self._query_struct: Dict[int, struct.Struct] = {}
+        self._search_cache = SimilarityCache()
+
+    @staticmethod
+    def _pdf_index_key(collection_name: str, pdf_id) -> str:
+        """Key of the SET listing every hash key stored for a pdf_id
+
+        Deliberately outside the "{collection_name}:" prefix so the search
+        index never tries to ingest it as a document hash.
+        """
+        return f"{collection_name}_pdfidx:{pdf_id}"
+
+    @staticmethod
+    def _vec_bytes(vector) -> bytes:
+        """Serialize a vector to the FLOAT32 blob the index schema expects
+
+        One C-level memcpy via numpy instead of per-element struct packing.
+        """
+        return np.ascontiguousarray(vector, dtype=np.float32).tobytes()
 
     async def connect(self) -> None:
-        """Connect to Redis and verify connection"""
+        """Connect to Redis, reusing the process-wide verified client"""
         try:
-            self.client = redis.Redis(
-                host=self.host,
-                port=self.port,
-                decode_responses=False,  # We'll handle binary data for vectors
-                socket_timeout=5,
-                socket_connect_timeout=5
-            )
-            # Verify connection
-            await self.client.ping()
+            self.client = await _get_client(self.host, self.port)
+            # Decoding client for the search path: hiredis converts reply
+            # bulk strings to str in C instead of per-field Python decodes
+            self._text_client = await _get_client(self.host, self.port, decode_responses=True)
             print(f"Connected to Redis at {self.host}:{self.port}")
         except Exception as e:
+            # Evict so the next connect() rebuilds and re-verifies
+            _CLIENTS.pop((self.host, self.port, False), None)
+            _CLIENTS.pop((self.host, self.port, True), None)
             raise HTTPException(status_code=500, detail=f"Failed to connect to Redis: {str(e)}")
 
     async def create_collection(self, collection_name: str, dimension: int) -> None:
@@ -39,28 +114,34 @@ class RedisAdapter(VectorDatabase):
 
             # Drop existing index if it exists (ignore errors if not found)
             try:
-                await self.client.execute_command("FT.DROPINDEX", index_name, "DD")
+                await self.client.ft(index_name).dropindex(delete_documents=True)
                 print(f"Dropped existing index: {index_name}")
             except redis.ResponseError:
                 pass  # Index doesn't exist, which is fine
 
-            # Create index with vector field and metadata fields
-            # Using HNSW algorithm for vector similarity search
-            await self.client.execute_command(
-                "FT.CREATE", index_name,
-                "ON", "HASH",
-                "PREFIX", "1", f"{collection_name}:",
-                "SCHEMA",
-                "vector", "VECTOR", "HNSW", "6",
-                    "TYPE", "FLOAT32",
-                    "DIM", str(dimension),
-                    "DISTANCE_METRIC", "COSINE",
-                "pdf_id", "TAG",
-                "page_num", "NUMERIC",
-                "patch_index", "NUMERIC",
-                "title", "TEXT"
+            # Create index with vector field and metadata fields via the
+            # search command builder -- no hand-spliced FT.CREATE arg list
+            schema = (
+                VectorField("vector", "HNSW", {
+                    "TYPE": "FLOAT32",
+                    "DIM": dimension,
+                    "DISTANCE_METRIC": "COSINE"
+                }),
+                TagField("pdf_id"),
+                NumericField("page_num"),
+                NumericField("patch_index"),
+                TextField("title")
+            )
+            await self.client.ft(index_name).create_index(
+                fields=schema,
+                definition=IndexDefinition(
+                    prefix=[f"{collection_name}:"],
+                    index_type=IndexType.HASH
+                )
             )
 
+            # Recreating the index dropped its documents; cached hits are stale
+            self._search_cache.clear(collection_name)
             print(f"Created Redis index: {index_name} with dimension {dimension}")
 
         except Exception as e:
@@ -80,11 +161,50 @@ class RedisAdapter(VectorDatabase):
         if len(vectors) != len(metadata):
             raise HTTPException(status_code=400, detail="Vectors and metadata length mismatch")
 
+        if not vectors:
+            return
+
         try:
-            # Use pipeline for batch operations
-            pipe = self.client.pipeline()
+            # Pack the whole batch with one numpy conversion and slice the
+            # raw buffer per row: a single C-level copy instead of a Python
+            # per-element pack for every vector
+            arr = np.ascontiguousarray(vectors, dtype=np.float32)
+            raw = arr.tobytes()
+            row_bytes = arr.shape[1] * 4
+
+            await self.insert_bytes(collection_name, raw, metadata, row_bytes)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to insert vectors: {str(e)}")
+
+    async def insert_bytes(
+        self,
+        collection_name: str,
+        packed: bytes,
+        metadata: List[Dict[str, Any]],
+        row_bytes: int
+    ) -> None:
+        """Insert pre-packed little-endian FLOAT32 vectors
 
-            for i, (vector, meta) in enumerate(zip(vectors, metadata)):
+        For callers that already hold a contiguous float32 buffer (numpy
+        array, torch tensor, Parquet column) -- the blob is sliced per row
+        with zero further conversion.
+        """
+        if not self.client:
+            raise HTTPException(status_code=500, detail="Not connected to Redis")
+
+        if len(packed) != len(metadata) * row_bytes:
+            raise HTTPException(status_code=400, detail="Packed buffer and metadata length mismatch")
+
+        try:
+            # Use a non-transactional pipeline: no MULTI/EXEC wrapper, so
+            # the server executes commands as they stream in instead of
+            # buffering them for atomicity we don't need
+            pipe = self.client.pipeline(transaction=False)
+
+            for i, meta in enumerate(metadata):
                 # Create unique key for this vector
                 pdf_id = meta.get('pdf_id', 'unknown')
                 page_num = meta.get('page_num', 0)
@@ -92,23 +212,31 @@ class RedisAdapter(VectorDatabase):
 
                 key = f"{collection_name}:{pdf_id}:{page_num}:{patch_index}"
 
-                # Convert vector to binary FLOAT32 format
-                vector_bytes = struct.pack(f'{len(vector)}f', *vector)
-
-                # Store hash with vector and metadata
-                pipe.hset(
-                    key,
-                    mapping={
-                        'vector': vector_bytes,
-                        'pdf_id': str(pdf_id),
-                        'page_num': str(page_num),
-                        'patch_index': str(patch_index),
-                        'title': meta.get('title', '')
-                    }
+                # Store hash with vector and metadata; flat name/value args
+                # with pre-encoded field names skip the per-row dict build
+                # and redis-py's mapping unpacking
+                pipe.execute_command(
+                    'HSET', key,
+                    _FIELDS[0], packed[i * row_bytes:(i + 1) * row_bytes],
+                    _FIELDS[1], str(pdf_id),
+                    _FIELDS[2], str(page_num),
+                    _FIELDS[3], str(patch_index),
+                    _FIELDS[4], meta.get('title') or ''
                 )
+                # Track the key in the per-PDF index set so delete can
+                # resolve members directly instead of scanning the keyspace
+                pipe.sadd(self._pdf_index_key(collection_name, pdf_id), key)
 
-            # Execute all commands in batch
-            await pipe.execute()
+                # Flush every 1000 queued commands to cap client-side
+                # buffering; still one RTT per 1000 HSETs instead of per key
+                if len(pipe) >= 1000:
+                    await pipe.execute()
+
+            # Execute any remaining commands
+            if len(pipe):
+                await pipe.execute()
+
+            self._search_cache.clear(collection_name)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to insert vectors: {str(e)}")
@@ -121,57 +249,65 @@ class RedisAdapter(VectorDatabase):
         filter: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """Search for similar vectors using Redis vector search with deduplication"""
+        # Near-duplicate queries (common in repetitive RAG traffic) are
+        # served straight from the similarity cache
+        cached = self._search_cache.get(collection_name, query_vector)
+        if cached is not None:
+            return cached
+
         if not self.client:
             raise HTTPException(status_code=500, detail="Not connected to Redis")
 
         try:
             index_name = f"{collection_name}_idx"
 
-            # Convert query vector to binary format
-            query_bytes = struct.pack(f'{len(query_vector)}f', *query_vector)
-
-            # Fetch 3x the requested amount to ensure enough unique PDFs after deduplication
-            # Build the KNN query
-            result = await self.client.execute_command(
-                "FT.SEARCH", index_name,
-                f"*=>[KNN {top_k * 3} @vector $query_blob]",
+            # Convert query vector to binary format. numpy inputs take the
+            # memcpy path; plain lists pack via a Struct cached per
+            # dimension, skipping the format-string parse on every query
+            if isinstance(query_vector, np.ndarray):
+                query_bytes = self._vec_bytes(query_vector)
+            else:
+                dim = len(query_vector)
+                packer = self._query_struct.get(dim)
+                if packer is None:
+                    packer = self._query_struct.setdefault(dim, struct.Struct(f'<{dim}f'))
+                query_bytes = packer.pack(*query_vector)
+
+            # KNN over 3x candidates, deduplicated server-side: GROUPBY
+            # pdf_id keeps the best-distance row per PDF via FIRST_VALUE,
+            # so only top_k flat rows cross the wire and no Python dedup
+            # pass is needed. Issued on the decoding client: every loaded
+            # field is text, so hiredis hands back str replies. The binary
+            # query blob goes out through PARAMS regardless
+            result = await self._text_client.execute_command(
+                "FT.AGGREGATE", index_name,
+                f"*=>[KNN {top_k * 3} @vector $query_blob AS vs]",
+                "LOAD", "4", "@pdf_id", "@page_num", "@patch_index", "@title",
+                "GROUPBY", "1", "@pdf_id",
+                "REDUCE", "FIRST_VALUE", "4", "@vs", "BY", "@vs", "ASC", "AS", "vs",
+                "REDUCE", "FIRST_VALUE", "4", "@page_num", "BY", "@vs", "ASC", "AS", "page_num",
+                "REDUCE", "FIRST_VALUE", "4", "@patch_index", "BY", "@vs", "ASC", "AS", "patch_index",
+                "REDUCE", "FIRST_VALUE", "4", "@title", "BY", "@vs", "ASC", "AS", "title",
+                "SORTBY", "2", "@vs", "ASC",
+                "LIMIT", "0", str(top_k),
                 "PARAMS", "2", "query_blob", query_bytes,
-                "RETURN", "5", "pdf_id", "page_num", "patch_index", "title", "__vector_score",
-                "SORTBY", "__vector_score",
                 "DIALECT", "2"
             )
 
-            # Parse results and deduplicate by pdf_id
-            # Result format: [total_count, key1, [field1, value1, field2, value2, ...], key2, [...], ...]
-            seen_pdfs = {}
-            if result[0] > 0:  # Check if we have results
-                # Skip the count (index 0), iterate through key-value pairs
-                for i in range(1, len(result), 2):
-                    key = result[i].decode('utf-8') if isinstance(result[i], bytes) else result[i]
-                    fields = result[i + 1]
-
-                    # Parse fields into dict
-                    field_dict = {}
-                    for j in range(0, len(fields), 2):
-                        field_name = fields[j].decode('utf-8') if isinstance(fields[j], bytes) else fields[j]
-                        field_value = fields[j + 1].decode('utf-8') if isinstance(fields[j + 1], bytes) else fields[j + 1]
-                        field_dict[field_name] = field_value
-
-                    pdf_id = field_dict.get('pdf_id', '')
-
-                    # Keep only the first (highest scoring) result for each pdf_id
-                    if pdf_id not in seen_pdfs:
-                        seen_pdfs[pdf_id] = {
-                            'pdf_id': pdf_id,
-                            'page_num': int(field_dict.get('page_num', 0)),
-                            'patch_index': int(field_dict.get('patch_index', 0)),
-                            'title': field_dict.get('title', ''),
-                            'score': 1.0 - float(field_dict.get('__vector_score', '1.0'))  # Convert distance to similarity
-                        }
-
-            # Convert to list and take top_k
-            results = list(seen_pdfs.values())[:top_k]
-
+            # Result format: [group_count, [field, value, ...], ...] --
+            # one flat name/value row per pdf_id, already distance-sorted
+            results = []
+            for row in result[1:]:
+                field_dict = dict(zip(row[0::2], row[1::2]))
+                results.append({
+                    'pdf_id': field_dict.get('pdf_id', ''),
+                    'page_num': int(field_dict.get('page_num', 0)),
+                    'patch_index': int(field_dict.get('patch_index', 0)),
+                    'title': field_dict.get('title', ''),
+                    'score': 1.0 - float(field_dict.get('vs', '1.0'))  # Convert distance to similarity
+                })
+
+            self._search_cache.put(collection_name, query_vector, results)
             return results
 
         except Exception as e:
@@ -187,34 +323,31 @@ class RedisAdapter(VectorDatabase):
             raise HTTPException(status_code=500, detail="Not connected to Redis")
 
         try:
-            total_deleted = 0
-
+            # Resolve members via the per-PDF index sets maintained on
+            # insert: O(matching keys) and one round trip for the whole
+            # batch, versus a full-keyspace SCAN per pdf_id
+            pipe = self.client.pipeline(transaction=False)
             for pdf_id in ids:
-                # Pattern to match all keys for this PDF
-                pattern = f"{collection_name}:{pdf_id}:*"
-
-                # Find all matching keys using SCAN
-                keys_to_delete = []
-                cursor = 0
-                while True:
-                    cursor, keys = await self.client.scan(cursor, match=pattern, count=1000)
-                    keys_to_delete.extend(keys)
-                    if cursor == 0:
-                        break
-
-                # Delete all matching keys
-                if keys_to_delete:
-                    deleted = await self.client.delete(*keys_to_delete)
-                    total_deleted += deleted
-                    print(f"Deleted {deleted} keys for pdf_id: {pdf_id}")
+                pipe.smembers(self._pdf_index_key(collection_name, pdf_id))
+            member_sets = await pipe.execute()
+
+            total_deleted = 0
+            pipe = self.client.pipeline(transaction=False)
+            for pdf_id, members in zip(ids, member_sets):
+                if members:
+                    pipe.delete(*members)
+                    total_deleted += len(members)
+                pipe.delete(self._pdf_index_key(collection_name, pdf_id))
+            await pipe.execute()
 
+            self._search_cache.clear(collection_name)
             print(f"Total deleted: {total_deleted} keys")
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to delete: {str(e)}")
 
     async def disconnect(self) -> None:
-        """Close Redis connection"""
+        """Drop the reference; the shared client and its sockets live on"""
         if self.client:
-            await self.client.close()
+            self.client = None
             print("Disconnected from Redis")
\ No newline at end of file
@@ -0,0 +1,111 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+class _Shard:
+    """Centroid store for one collection's cached queries"""
+
+    def __init__(self, threshold: float, max_entries: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._centroids: Optional[np.ndarray] = None  # [K, D] float32, unit norm
+        self._counts: List[int] = []
+        self._results: List[List[Dict[str, Any]]] = []
+        self._last_used: List[int] = []
+        self._clock = 0
+
+    def _best_match(self, q: np.ndarray) -> Optional[int]:
+        if self._centroids is None or len(self._results) == 0:
+            return None
+        sims = self._centroids @ q
+        idx = int(np.argmax(sims))
+        return idx if sims[idx] >= self.threshold else None
+
+    def get(self, q: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        idx = self._best_match(q)
+        if idx is None:
+            return None
+        self._clock += 1
+        self._last_used[idx] = self._clock
+        return self._results[idx]
+
+    def put(self, q: np.ndarray, results: List[Dict[str, Any]]) -> None:
+        self._clock += 1
+
+        idx = self._best_match(q)
+        if idx is not None:
+            # Fold the query into the centroid's running mean and keep it
+            # on the unit sphere so cosine stays a dot product
+            count = self._counts[idx] + 1
+            centroid = self._centroids[idx] + (q - self._centroids[idx]) / count
+            self._centroids[idx] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+            self._counts[idx] = count
+            self._results[idx] = results
+            self._last_used[idx] = self._clock
+            return
+
+        if len(self._results) >= self.max_entries:
+            evict = int(np.argmin(self._last_used))
+            self._centroids = np.delete(self._centroids, evict, axis=0)
+            del self._counts[evict]
+            del self._results[evict]
+            del self._last_used[evict]
+
+        if self._centroids is None:
+            self._centroids = q[np.newaxis, :]
+        else:
+            self._centroids = np.vstack([self._centroids, q])
+        self._counts.append(1)
+        self._results.append(results)
+        self._last_used.append(self._clock)
+
+
+class SimilarityCache:
+    """Centroid-based cache for vector search results, keyed by collection
+
+    RAG-style traffic repeats semantically similar queries; near-duplicate
+    query embeddings can reuse earlier results instead of paying a DB
+    round trip plus HNSW traversal. Queries are matched against stored
+    centroids by cosine similarity (one BLAS matrix-vector product); on a
+    hit the cached result list is returned, on a miss the caller runs the
+    real search and records it here. Centroids track the running mean of
+    the queries they absorbed, and each collection's shard is LRU-bounded.
+    Entries never cross collections: each collection gets its own shard,
+    and writes clear only the collection they touched.
+    """
+
+    def __init__(self, threshold: float = 0.86, max_entries: int = 256):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._shards: Dict[str, _Shard] = {}
+
+    @staticmethod
+    def _normalize(query_vector) -> np.ndarray:
+        q = np.asarray(query_vector, dtype=np.float32).ravel()
+        return q / max(float(np.linalg.norm(q)), 1e-12)
+
+    def get(self, collection_name: str, query_vector) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for a near-duplicate query, or None"""
+        shard = self._shards.get(collection_name)
+        if shard is None:
+            return None
+        return shard.get(self._normalize(query_vector))
+
+    def put(self, collection_name: str, query_vector, results: List[Dict[str, Any]]) -> None:
+        """Record search results, merging into a nearby centroid if any"""
+        shard = self._shards.get(collection_name)
+        if shard is None:
+            shard = self._shards.setdefault(
+                collection_name, _Shard(self.threshold, self.max_entries)
+            )
+        shard.put(self._normalize(query_vector), results)
+
+    def clear(self, collection_name: Optional[str] = None) -> None:
+        """Drop one collection's entries, or everything when no name given
+
+        Call after any write or recreate so results never go stale.
+        """
+        if collection_name is None:
+            self._shards = {}
+        else:
+            self._shards.pop(collection_name, None)
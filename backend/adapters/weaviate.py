@@ -1,12 +1,38 @@
 from typing import List, Dict, Any, Optional
 import os
 import uuid
+import numpy as np
 import weaviate
 from weaviate.classes.config import Configure, Property, DataType, VectorDistances
 from weaviate.classes.query import MetadataQuery, Filter
 from weaviate.util import generate_uuid5
 from fastapi import HTTPException
 from .base import VectorDatabase
+from .similarity_cache import SimilarityCache
+
+
+# Process-wide client cache keyed by server address. connect_to_local
+# pays a TCP + gRPC handshake and a readiness probe each time; sharing
+# one client across adapter instances does that once per server
+_CLIENTS: Dict[tuple, weaviate.WeaviateClient] = {}
+
+
+def _get_client(host: str, port: int) -> weaviate.WeaviateClient:
+    key = (host, port)
+    client = _CLIENTS.get(key)
+    if client is None:
+        # Explicit gRPC port so batch and query traffic ride the v4 gRPC
+        # channel instead of falling back to REST
+        client = weaviate.connect_to_local(
+            host=host,
+            port=port,
+            grpc_port=int(os.getenv("WEAVIATE_GRPC_PORT", "50051"))
+        )
+        if not client.is_ready():
+            client.close()
+            raise Exception("Weaviate is not ready")
+        _CLIENTS[key] = client
+    return client
 
 
 class WeaviateAdapter(VectorDatabase):
@@ -15,23 +41,16 @@ class WeaviateAdapter(VectorDatabase):
         self.client = None
         self.host = os.getenv("WEAVIATE_HOST", "localhost")
         self.port = int(os.getenv("WEAVIATE_PORT", "8080"))
+        self._search_cache = SimilarityCache()
 
     async def connect(self) -> None:
-        """Connect to Weaviate server"""
+        """Connect to Weaviate, reusing the process-wide client"""
         try:
-            # Connect to Weaviate using v4 client API
-            self.client = weaviate.connect_to_local(
-                host=self.host,
-                port=self.port
-            )
-
-            # Test connection by checking if client is ready
-            if self.client.is_ready():
-                print(f"Connected to Weaviate at {self.host}:{self.port}")
-            else:
-                raise Exception("Weaviate is not ready")
-
+            self.client = _get_client(self.host, self.port)
+            print(f"Connected to Weaviate at {self.host}:{self.port}")
         except Exception as e:
+            # Evict so the next connect() performs a fresh handshake
+            _CLIENTS.pop((self.host, self.port), None)
             raise HTTPException(
                 status_code=500,
                 detail=f"{self.name}: Failed to connect - {str(e)}"
@@ -66,6 +85,8 @@ class WeaviateAdapter(VectorDatabase):
                 )
             )
 
+            # The recreate dropped all objects; cached hits are stale
+            self._search_cache.clear(collection_name)
             print(f"Created Weaviate collection '{class_name}' with dimension {dimension}")
 
         except Exception as e:
@@ -96,41 +117,36 @@ class WeaviateAdapter(VectorDatabase):
             class_name = collection_name.capitalize()
             collection = self.client.collections.get(class_name)
 
-            # Prepare data objects for batch insert
-            objects = []
-            for i, (vector, meta) in enumerate(zip(vectors, metadata)):
-                # Generate deterministic UUID from metadata (for idempotent inserts)
-                pdf_id = meta.get('pdf_id', '')
-                page_num = meta.get('page_num', 0)
-                patch_index = meta.get('patch_index', i)
-
-                # Create deterministic UUID using pdf_id, page_num, and patch_index
-                unique_str = f"{pdf_id}_{page_num}_{patch_index}"
-                object_uuid = generate_uuid5(unique_str)
-
-                # Create data object with properties and vector
-                obj = {
-                    "uuid": object_uuid,
-                    "properties": {
-                        "pdf_id": str(pdf_id),
-                        "page_num": int(page_num),
-                        "patch_index": int(patch_index),
-                        "title": meta.get('title', '')
-                    },
-                    "vector": vector
-                }
-                objects.append(obj)
-
-            # Batch insert objects
-            with collection.batch.dynamic() as batch:
-                for obj in objects:
+            # Convert the batch to float32 rows up front so the client
+            # serializes straight to protobuf without per-element coercion
+            arr = np.asarray(vectors, dtype=np.float32)
+
+            # Feed rows straight to the batch: building an intermediate
+            # object list would allocate a wrapper dict per row only to
+            # unpack it again one loop later. Fixed sizing keeps the gRPC
+            # pipe full for bulk ingest instead of letting dynamic mode
+            # re-tune batch size mid-stream
+            with collection.batch.fixed_size(batch_size=500, concurrent_requests=4) as batch:
+                for i, meta in enumerate(metadata):
+                    pdf_id = meta.get('pdf_id', '')
+                    page_num = meta.get('page_num', 0)
+                    patch_index = meta.get('patch_index', i)
+
                     batch.add_object(
-                        properties=obj["properties"],
-                        vector=obj["vector"],
-                        uuid=obj["uuid"]
+                        properties={
+                            "pdf_id": str(pdf_id),
+                            "page_num": int(page_num),
+                            "patch_index": int(patch_index),
+                            "title": meta.get('title', '')
+                        },
+                        vector=arr[i],
+                        # Deterministic UUID from the natural key keeps
+                        # re-inserts idempotent
+                        uuid=generate_uuid5(f"{pdf_id}_{page_num}_{patch_index}")
                     )
 
-            print(f"Inserted {len(objects)} vectors into '{class_name}'")
+            self._search_cache.clear(collection_name)
+            print(f"Inserted {len(metadata)} vectors into '{class_name}'")
 
         except Exception as e:
             raise HTTPException(
@@ -146,6 +162,12 @@ class WeaviateAdapter(VectorDatabase):
         filter: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """Search for similar vectors using cosine similarity with deduplication"""
+        # Near-duplicate queries (common in repetitive RAG traffic) are
+        # served straight from the similarity cache
+        cached = self._search_cache.get(collection_name, query_vector)
+        if cached is not None:
+            return cached
+
         if not self.client:
             await self.connect()
 
@@ -179,10 +201,15 @@ class WeaviateAdapter(VectorDatabase):
                         'title': obj.properties.get('title'),
                         'score': score
                     }
+                    # Objects arrive sorted by distance, so stop parsing
+                    # once top_k unique PDFs have been collected
+                    if len(seen_pdfs) >= top_k:
+                        break
 
             # Convert to list and take top_k
             results = list(seen_pdfs.values())[:top_k]
 
+            self._search_cache.put(collection_name, query_vector, results)
             return results
 
         except Exception as e:
@@ -205,14 +232,15 @@ class WeaviateAdapter(VectorDatabase):
             class_name = collection_name.capitalize()
             collection = self.client.collections.get(class_name)
 
-            # Delete all objects matching any of the pdf_ids
-            for pdf_id in ids:
-                collection.data.delete_many(
-                    where=Filter.by_property("pdf_id").equal(pdf_id)
-                )
-                print(f"Deleted objects for pdf_id: {pdf_id}")
+            # Delete all objects matching any of the pdf_ids in a single
+            # request: contains_any batches the whole id list server-side
+            # instead of one delete_many round trip per pdf_id
+            result = collection.data.delete_many(
+                where=Filter.by_property("pdf_id").contains_any(ids)
+            )
 
-            print(f"Deleted vectors for {len(ids)} PDFs from '{class_name}'")
+            self._search_cache.clear(collection_name)
+            print(f"Deleted {result.successful} vectors for {len(ids)} PDFs from '{class_name}'")
 
         except Exception as e:
             raise HTTPException(
@@ -221,7 +249,7 @@ class WeaviateAdapter(VectorDatabase):
             )
 
     async def disconnect(self) -> None:
-        """Close the connection to Weaviate"""
+        """Drop the reference; the shared client stays connected"""
         if self.client:
-            self.client.close()
+            self.client = None
             print(f"Disconnected from Weaviate")
\ No newline at end of file
@@ -107,6 +107,10 @@ async def ingest_all_training_data():
             print(f"Estimated remaining: {((len(embedding_files)-idx)/idx)*elapsed:.1f}s")
             print("-" * 23)
 
+    # Turn index maintenance back on (HNSW build, refresh) now that the
+    # bulk load is done; no-op for adapters that index as they go
+    await db_adapter.finalize_ingest("patterns")
+
     # Final report
     total_time = time.time() - start_time
 
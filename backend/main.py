@@ -167,6 +167,9 @@ async def test_insert_embeddings(num_pdfs: int = 2):
                 total_inserted += len(metadata_list)
                 print(f"Inserted {len(metadata_list)} embeddings for {pdf_name} page {page_idx}")
 
+        # Make the inserted documents searchable (refresh/index build for
+        # adapters that defer it during bulk inserts)
+        await db_adapter.finalize_ingest("patterns")
         await db_adapter.disconnect()
 
         return {
@@ -239,6 +242,9 @@ async def upload_pdf(file: UploadFile = File(...)):
         db_adapter = get_database_adapter(VECTOR_DB_TYPE)
         await db_adapter.connect()
         await db_adapter.insert("patterns", all_vectors, all_metadata)
+        # Make the uploaded PDF searchable right away on adapters that
+        # defer refresh/index work during inserts
+        await db_adapter.finalize_ingest("patterns")
         await db_adapter.disconnect()
 
         return {